@@ -9,14 +9,17 @@ insanity_counter = 0
 
 
 @bpy.app.handlers.persistent
-def s3o_placeholder_depsgraph_listener(*_):
-    depsgraph = bpy.context.evaluated_depsgraph_get()
-
+def s3o_placeholder_depsgraph_listener(_scene: bpy.types.Scene, depsgraph: bpy.types.Depsgraph):
     global insanity_counter
     global responding_to_depsgraph
     if responding_to_depsgraph:
         return
 
+    # this runs after every single depsgraph update (viewport navigation, frame changes, edits, ...)
+    # so bail out as cheaply as possible when no objects were touched
+    if not depsgraph.id_type_updated('OBJECT'):
+        return
+
     try:
         if insanity_counter != 0:
             warnings.warn_explicit(f's3o props depsgraph listener has looped {insanity_counter} times!!')
@@ -336,11 +336,11 @@ class S3OifyExistingObjectHierarchy(Operator):
         return {'FINISHED'}
 
 
-def add_ops_menu_func(menu: Menu, _: Context):
+def add_ops_menu_func(menu: Menu, context: Context):
     menu.layout.operator(AddS3ORoot.bl_idname, icon='EMPTY_ARROWS')
     menu.layout.operator(AddS3OAimPoint.bl_idname, icon='EMPTY_SINGLE_ARROW')
     row = menu.layout.row()
-    row.enabled = bpy.ops.s3o_tools.add_mesh_as_child.poll()
+    row.enabled = AddMeshAsChild.poll(context)
     row.operator_menu_enum(AddMeshAsChild.bl_idname, 'mesh_type', icon='OUTLINER_OB_MESH')
     menu.layout.separator()
 
@@ -50,6 +50,7 @@ class S3ORootProperties(S3OPropertyGroup):
             self.being_updated = True
             obj: Object = self.id_data
             obj_pos = obj.matrix_world.translation
+            midpoint_bl = self.midpoint @ util.TO_FROM_BLENDER_SPACE
 
             col_radius_pl = get_or_create_placeholder_empty(
                 obj, context,
@@ -59,7 +60,7 @@ class S3ORootProperties(S3OPropertyGroup):
                 col_radius_pl.empty_display_type = 'SPHERE'
                 col_radius_pl.empty_display_size = self.collision_radius
                 col_radius_pl.matrix_world = Matrix.LocRotScale(
-                    self.midpoint @ util.TO_FROM_BLENDER_SPACE + obj_pos,
+                    midpoint_bl + obj_pos,
                     None,
                     None
                 )
@@ -71,10 +72,11 @@ class S3ORootProperties(S3OPropertyGroup):
             if height_pl is not None:
                 height_pl.empty_display_type = 'CIRCLE'
                 height_pl.empty_display_size = self.collision_radius / 2
+                # s3o y (height) maps onto blender z, the other axes match the midpoint
+                height_pos = midpoint_bl.copy()
+                height_pos.z = self.height
                 height_pl.matrix_world = Matrix.LocRotScale(
-                    Vector(
-                        (self.midpoint.x, self.height, self.midpoint.z)
-                    ) @ util.TO_FROM_BLENDER_SPACE + obj_pos,
+                    height_pos + obj_pos,
                     Euler((math.pi / 2, 0, 0)),
                     None
                 )
@@ -1,6 +1,7 @@
 import math
 import struct
 from enum import Enum
+from itertools import chain
 from typing import NamedTuple, Self
 
 import numpy
@@ -28,15 +29,15 @@ primitive_type
     * 2: quads
 """
 
-_S3OVertex_struct = struct.Struct("< 3f 3f 2f")
+_S3OVertex_num_floats = 8
 """
-* position
-* normal
-* tex_coord
+little endian 32-bit floats, read and written as numpy blocks
+* position (3)
+* normal (3)
+* tex_coord (2)
 """
 
 _S3OChildOffset_struct = struct.Struct("< i")
-_S3OIndex_struct = struct.Struct("< i")
 
 
 class S3OVertex(NamedTuple):
@@ -120,22 +121,16 @@ class S3OPiece:
 
         piece.primitive_type = primitive_type
 
-        piece.vertices = []
-        for i in range(num_vertices):
-            current_offset = vertex_offset + _S3OVertex_struct.size * i
-            vertex = _S3OVertex_struct.unpack_from(data, current_offset)
+        # the vertex and index blocks are contiguous little endian arrays, read each of them with a single frombuffer
+        vertex_data = numpy.frombuffer(
+            data, dtype='<f4', count=num_vertices * _S3OVertex_num_floats, offset=vertex_offset
+        ).reshape(-1, _S3OVertex_num_floats)
+        piece.vertices = [
+            S3OVertex(Vector(vertex[:3]), Vector(vertex[3:6]), Vector(vertex[6:]))
+            for vertex in vertex_data.tolist()
+        ]
 
-            position = Vector(vertex[:3])
-            normal = Vector(vertex[3:6])
-            tex_coords = Vector(vertex[6:])
-
-            piece.vertices.append(S3OVertex(position, normal, tex_coords))
-
-        piece.indices = []
-        for i in range(num_indices):
-            current_offset = index_offset + _S3OIndex_struct.size * i
-            index, = _S3OIndex_struct.unpack_from(data, current_offset)
-            piece.indices.append(index)
+        piece.indices = numpy.frombuffer(data, dtype='<i4', count=num_indices, offset=index_offset).tolist()
 
         piece.children = []
         for i in range(num_children):
@@ -193,18 +188,13 @@ class S3OPiece:
             child_data += _S3OChildOffset_struct.pack(0)
 
         vertex_offset = children_offset + len(child_data)
-        vertex_data = b''
-        for pos, nor, uv in self.vertices:
-            vertex_data += _S3OVertex_struct.pack(
-                pos[0], pos[1], pos[2],
-                nor[0], nor[1], nor[2],
-                uv[0], uv[1]
-            )
+        vertex_data = numpy.fromiter(
+            chain.from_iterable(chain(pos, nor, uv) for pos, nor, uv in self.vertices),
+            dtype='<f4', count=len(self.vertices) * _S3OVertex_num_floats
+        ).tobytes()
 
         index_offset = vertex_offset + len(vertex_data)
-        index_data = b''
-        for index in self.indices:
-            vertex_data += _S3OIndex_struct.pack(index)
+        index_data = numpy.array(self.indices, dtype='<i4').tobytes()
 
         primitive_type = self.primitive_type.value
 
@@ -1,17 +1,48 @@
-import dataclasses
-from typing import Self
+from itertools import chain
+from typing import NamedTuple
 
 import numpy
 
 import bmesh
 import bpy.types
-import bpy_extras.object_utils
 from bpy_extras import object_utils
 from mathutils import Vector
 from . import util, vertex_cache
 from .obj_props import S3ORootProperties, S3OAimPointProperties
 from .s3o import S3O, S3OPiece, S3OVertex
-from .util import batched, TO_FROM_BLENDER_SPACE
+from .util import TO_FROM_BLENDER_SPACE
+
+_scratch_bmesh: bmesh.types.BMesh | None = None
+
+
+def get_scratch_bmesh() -> bmesh.types.BMesh:
+    """
+    :return: an empty BMesh that is shared between calls, so the pieces don't each allocate their own.
+             Its contents are cleared out on the next call, so copy out anything that should be kept first!
+    """
+    global _scratch_bmesh
+    if _scratch_bmesh is None or not _scratch_bmesh.is_valid:
+        _scratch_bmesh = bmesh.new()
+    else:
+        _scratch_bmesh.clear()
+    return _scratch_bmesh
+
+
+class S3OMeshData(NamedTuple):
+    """ The arrays needed to build the blender mesh for a piece, see prepare_s3o_mesh_data """
+    vert_positions: numpy.ndarray
+    """ (V, 3) float32 """
+    corner_vert_indices: numpy.ndarray
+    """ (F, 3) int32 """
+    corner_tex_coords: numpy.ndarray
+    """ (F * 3, 2) float32 """
+    corner_ao_colors: numpy.ndarray
+    """ (F * 3, 4) float32 """
+
+
+def _vectors_to_array(vectors: list[Vector], size: int, dtype=float) -> numpy.ndarray:
+    """ Pack a list of equally sized Vectors into an (N, size) array, streaming their components through fromiter """
+    return numpy.fromiter(chain.from_iterable(vectors), dtype=dtype, count=len(vectors) * size).reshape(-1, size)
 
 
 def s3o_to_blender_obj(
@@ -101,100 +132,115 @@ def set_aim_point_props(obj: bpy.types.Object, position: Vector, direction: Vect
     obj.s3o_aim_point.dir = direction
 
 
-def make_bl_obj_from_s3o_mesh(
-    piece: S3OPiece,
-    *,
-    merge_vertices=True
-) -> bpy.types.Object:
-    for vertex in piece.vertices:
-        vertex.normal.normalize()
+def prepare_s3o_mesh_data(piece: S3OPiece, *, merge_vertices=True) -> S3OMeshData:
+    """
+    Works out the vertices and faces of the blender mesh for a piece.
+    Does not touch bpy at all, see make_bl_obj_from_s3o_mesh for building the mesh from them.
+    """
+    # normals written by most exporters are already unit length, only normalize the ones that aren't
+    # (zero length normals are left alone, same as Vector.normalize() would)
+    normals = _vectors_to_array([v.normal for v in piece.vertices], 3, numpy.float32)
+    normals_length_sq = numpy.einsum('ij,ij->i', normals, normals)
+    for i in numpy.flatnonzero((numpy.abs(normals_length_sq - 1) > 1e-4) & (normals_length_sq > 0)).tolist():
+        piece.vertices[i].normal.normalize()
 
     p_vertices = piece.vertices
-    p_indices: list[tuple[int, int]] = [(idx, idx) for idx in piece.indices]
-    """ vertex index, ao index """
 
-    # store this now so that values are not overlooked as a result of the de-duplication steps
-    v_ambient_occlusion: list[float] = [v.ambient_occlusion for v in p_vertices]
-
-    if merge_vertices:
-        duplicate_verts = util.make_duplicates_mapping(p_vertices, 0.001)
-
-        for i, current_vert_index in enumerate(idx_pair[0] for idx_pair in p_indices):
-            p_indices[i] = (duplicate_verts[current_vert_index], p_indices[i][1])
-
-    type_face_indices = list[tuple[int, int, int, int]]
-
-    face_indices_list: list[type_face_indices] = [
-        [
-            (pair1[0], pair1[0], pair1[0], pair1[1]),
-            (pair2[0], pair2[0], pair2[0], pair2[1]),
-            (pair3[0], pair3[0], pair3[0], pair3[1]),
-        ]
-        for pair1, pair2, pair3 in util.batched(p_indices, 3)
-    ]
+    # one row per triangle, each corner holding a vertex index
+    face_indices = numpy.array(piece.indices, dtype=int).reshape(-1, 3)
 
     # unpack all the vertices into their separate components
-    # vertexes can share the values of these
-    v_positions: dict[int, Vector] = {}
-    v_normals: dict[int, Vector] = {}
+    v_positions = _vectors_to_array([v.position for v in p_vertices], 3)
+    v_normals = _vectors_to_array([v.normal for v in p_vertices], 3)
 
     # tex_coords are always considered unique per vertex
-    v_tex_coords: dict[int, Vector] = {}
+    # and the ao values are looked up with the original vertex indices too,
+    # so that values are not overlooked as a result of the de-duplication steps
+    v_tex_coords = _vectors_to_array([v.tex_coords for v in p_vertices], 2, numpy.float32)
+    v_ambient_occlusion = numpy.array([v.ambient_occlusion for v in p_vertices], dtype=numpy.float32)
 
-    for i, vertex in enumerate(p_vertices):
-        v_positions[i] = vertex.position
-        v_normals[i] = vertex.normal
-        v_tex_coords[i] = vertex.tex_coords
+    pos_indices = face_indices
+    norm_indices = face_indices
 
     if merge_vertices:
         duplicate_positions = util.make_duplicates_mapping(v_positions, 0.002)
         duplicate_normals = util.make_duplicates_mapping(v_normals, 0.01)
 
-        for face_indices in face_indices_list:
-            for i, (pos_idx, norm_idx, tex_coord_idx, ao_idx) in enumerate(face_indices):
-                face_indices[i] = (
-                    duplicate_positions[pos_idx],
-                    duplicate_normals[norm_idx],
-                    tex_coord_idx,
-                    ao_idx
-                )
+        pos_indices = duplicate_positions[pos_indices]
+        norm_indices = duplicate_normals[norm_indices]
     # endif merge_vertices
 
-    bm = bmesh.new()
-    bmesh_vert_lookup: dict[int, dict[int, bmesh.types.BMVert]] = {}
-    for face_indices in face_indices_list:
-        for (pos_idx, norm_idx, _, _) in face_indices:
-            if pos_idx not in bmesh_vert_lookup:
-                bmesh_vert_lookup[pos_idx] = {}
+    # each distinct (position, normal) pair becomes one mesh vertex, packed into a single key per face corner
+    corner_keys = (pos_indices.astype(numpy.int64) << 32) | norm_indices
+    _, first_corners, corner_vert_indices = numpy.unique(corner_keys, return_index=True, return_inverse=True)
+
+    # create the vertices in the order they are first used
+    vert_order = numpy.argsort(first_corners)
+    unique_to_vert_idx = numpy.empty_like(vert_order)
+    unique_to_vert_idx[vert_order] = numpy.arange(len(vert_order))
+    corner_vert_indices = unique_to_vert_idx[corner_vert_indices.ravel()].reshape(-1, 3)
+    vert_positions = v_positions[pos_indices.ravel()[first_corners[vert_order]]]
+
+    # skip degenerate faces and faces using the same vertices as an earlier face, neither makes a valid mesh
+    sorted_face_verts = numpy.sort(corner_vert_indices, axis=1)
+    keep_faces = numpy.zeros(len(sorted_face_verts), dtype=bool)
+    keep_faces[numpy.unique(sorted_face_verts, axis=0, return_index=True)[1]] = True
+    keep_faces &= (sorted_face_verts[:, 0] != sorted_face_verts[:, 1])
+    keep_faces &= (sorted_face_verts[:, 1] != sorted_face_verts[:, 2])
+    if not keep_faces.all():
+        print(f'{piece.name}: skipped {numpy.count_nonzero(~keep_faces)} degenerate or duplicate faces')
+
+    corner_data_indices = face_indices[keep_faces].ravel()
+    corner_ao_colors = numpy.ones((len(corner_data_indices), 4), dtype=numpy.float32)
+    corner_ao_colors[:, 0:3] = v_ambient_occlusion[corner_data_indices].reshape(-1, 1)
+
+    return S3OMeshData(
+        vert_positions.astype(numpy.float32),
+        corner_vert_indices[keep_faces].astype(numpy.int32),
+        v_tex_coords[corner_data_indices],
+        corner_ao_colors,
+    )
+
+
+def make_bl_obj_from_s3o_mesh(
+    piece: S3OPiece,
+    *,
+    merge_vertices=True
+) -> bpy.types.Object:
+    mesh_data = prepare_s3o_mesh_data(piece, merge_vertices=merge_vertices)
 
-            if norm_idx not in bmesh_vert_lookup[pos_idx]:
-                vert = bm.verts.new(v_positions[pos_idx])
-                vert.normal = v_normals[norm_idx]
-                bmesh_vert_lookup[pos_idx][norm_idx] = vert
+    num_faces = len(mesh_data.corner_vert_indices)
 
-    uv_layer = bm.loops.layers.uv.new("UVMap")
-    ao_layer = bm.loops.layers.float_color.new("ambient_occlusion")
+    # all the vertices, corners and faces are set through foreach_set, straight from the prepared arrays
+    mesh = bpy.data.meshes.new(piece.name)
+    mesh.vertices.add(len(mesh_data.vert_positions))
+    mesh.vertices.foreach_set('co', mesh_data.vert_positions.ravel())
+    mesh.loops.add(num_faces * 3)
+    mesh.loops.foreach_set('vertex_index', mesh_data.corner_vert_indices.ravel())
+    mesh.polygons.add(num_faces)
+    mesh.polygons.foreach_set('loop_start', numpy.arange(0, num_faces * 3, 3, dtype=numpy.int32))
+    mesh.update(calc_edges=True)
 
-    for face_indices in face_indices_list:
-        face_verts = [bmesh_vert_lookup[pos_idx][norm_idx] for pos_idx, norm_idx, _, _ in face_indices]
-        try:
-            face = bm.faces.new(face_verts)
-            face.smooth = True
+    mesh.polygons.foreach_set('use_smooth', numpy.ones(num_faces, dtype=bool))
 
-            for i, loop in enumerate(face.loops):
-                _, _, tex_coord_idx, ao_idx = face_indices[i]
-                loop[uv_layer].uv = v_tex_coords[tex_coord_idx]
-                loop[ao_layer] = (*((v_ambient_occlusion[ao_idx],) * 3), 1)
-        except Exception as err:
-            print(err)
+    uv_layer = mesh.uv_layers.new(name="UVMap")
+    uv_layer.uv.foreach_set('vector', mesh_data.corner_tex_coords.ravel())
+
+    ao_layer = mesh.color_attributes.new("ambient_occlusion", 'FLOAT_COLOR', 'CORNER')
+    ao_layer.data.foreach_set('color', mesh_data.corner_ao_colors.ravel())
 
     if merge_vertices:
-        for edge in bm.edges:
-            edge.smooth = not edge.is_boundary
+        # mark the edges along the (still split) seams as sharp before merging the vertices along them
+        edge_face_counts = numpy.empty(num_faces * 3, dtype=numpy.int32)
+        mesh.loops.foreach_get('edge_index', edge_face_counts)
+        edge_face_counts = numpy.bincount(edge_face_counts, minlength=len(mesh.edges))
+        mesh.edges.foreach_set('use_edge_sharp', edge_face_counts == 1)
+
+        bm = get_scratch_bmesh()
+        bm.from_mesh(mesh)
         bmesh.ops.remove_doubles(bm, verts=bm.verts, dist=0.002)
+        bm.to_mesh(mesh)
 
-    mesh = bpy.data.meshes.new(piece.name)
-    bm.to_mesh(mesh)
     mesh.attributes.default_color_name = "ambient_occlusion"
     mesh.attributes.active_color_name = "ambient_occlusion"
 
@@ -271,67 +317,82 @@ def blender_obj_to_piece(obj: bpy.types.Object) -> S3OPiece | None:
         tmp_mesh: bpy.types.Mesh | None = None
         try:
             tmp_mesh: bpy.types.Mesh = obj.data.copy()
-            tmp_obj = bpy_extras.object_utils.object_data_add(bpy.context, tmp_mesh)
-            bpy.ops.object.select_all(action='DESELECT')
-            tmp_obj.select_set(True)
-
-            tmp_obj.matrix_world = obj.matrix_world
-            bpy.ops.object.transform_apply(location=False, rotation=True, scale=True)
 
-            bpy.ops.object.mode_set(mode='EDIT')
-            bpy.ops.mesh.select_all(action='SELECT')
-            bpy.ops.mesh.quads_convert_to_tris()
-            bpy.ops.mesh.delete_loose()
-            bpy.ops.object.mode_set(mode='OBJECT')
+            # apply the world rotation and scale (but not location) and convert to s3o space in one go,
+            # transforming the mesh copy directly leaves the original object and the selection untouched
+            tmp_mesh.transform(TO_FROM_BLENDER_SPACE @ obj.matrix_world.to_3x3().to_4x4())
 
-            tmp_mesh.transform(TO_FROM_BLENDER_SPACE)
+            bm = get_scratch_bmesh()
+            bm.from_mesh(tmp_mesh)
+            bmesh.ops.triangulate(bm, faces=bm.faces)
+            bmesh.ops.delete(bm, geom=[e for e in bm.edges if not e.link_faces], context='EDGES')
+            bmesh.ops.delete(bm, geom=[v for v in bm.verts if not v.link_edges], context='VERTS')
+            bm.to_mesh(tmp_mesh)
 
             uv_layer: bpy.types.MeshUVLoopLayer = tmp_mesh.uv_layers.active
             ao_layer: bpy.types.FloatColorAttribute = tmp_mesh.color_attributes.get('ambient_occlusion', None)
 
-            # face corner (aka loop) walking based on the .ply export implementation at:
+            num_loops = len(tmp_mesh.loops)
+
+            # face corner (aka loop) data is read in bulk with foreach_get
+            # based on the .ply export implementation at:
             # https://github.com/blender/blender/blob/main/source/blender/io/ply/exporter/ply_export_load_plydata.cc
-            @dataclasses.dataclass(eq=True, frozen=True, slots=True)
-            class FaceCornerData:
-                uv: (float, float)
-                ao: float
-                norm: (float, float, float)
-                v_idx: int
-
-                @classmethod
-                def from_loop_index(cls, l_idx: int) -> Self:
-                    uv = tuple(uv_layer.uv[l_idx].vector)
-                    ao = max(ao_layer.data[l_idx].color[0:3]) if ao_layer is not None else 0.9
-                    norm = tuple(tmp_mesh.corner_normals[l_idx].vector)
-                    v_idx = tmp_mesh.loops[l_idx].vertex_index
-                    return FaceCornerData(uv, ao, norm, v_idx)
-
-            vertex_map: dict[FaceCornerData, int] = {}
-
-            loop_to_s3o_idx: list[int] = []
-            s3o_idx_to_data: list[FaceCornerData] = []
-
-            for loop_index in range(len(tmp_mesh.loops)):
-                fc_data = FaceCornerData.from_loop_index(loop_index)
-                s3o_index = vertex_map.setdefault(fc_data, len(vertex_map))
-                loop_to_s3o_idx.append(s3o_index)
-                while len(s3o_idx_to_data) <= s3o_index:
-                    s3o_idx_to_data.append(fc_data)
-
-            for data in s3o_idx_to_data:
-                new_vert = S3OVertex(
-                    tmp_mesh.vertices[data.v_idx].co.copy(),
-                    Vector(data.norm),
-                    Vector(data.uv)
-                )
-                new_vert.ambient_occlusion = data.ao
+            loop_v_indices = numpy.empty(num_loops, dtype=numpy.int32)
+            tmp_mesh.loops.foreach_get('vertex_index', loop_v_indices)
+
+            loop_uvs = numpy.empty(num_loops * 2, dtype=numpy.float32)
+            uv_layer.uv.foreach_get('vector', loop_uvs)
+            loop_uvs = loop_uvs.reshape(-1, 2)
+
+            if ao_layer is not None:
+                ao_colors = numpy.empty(len(ao_layer.data) * 4, dtype=numpy.float32)
+                ao_layer.data.foreach_get('color', ao_colors)
+                loop_aos = ao_colors.reshape(-1, 4)[:, 0:3].max(axis=1)
+                if ao_layer.domain == 'POINT':
+                    loop_aos = loop_aos[loop_v_indices]
+            else:
+                loop_aos = numpy.full(num_loops, 0.9, dtype=numpy.float32)
+
+            num_polys = len(tmp_mesh.polygons)
+            poly_smooth = numpy.empty(num_polys, dtype=bool)
+            tmp_mesh.polygons.foreach_get('use_smooth', poly_smooth)
+
+            if not tmp_mesh.has_custom_normals and not poly_smooth.any():
+                # every face is flat shaded, so each corner simply uses its face normal;
+                # skip the (comparatively expensive) split normal calculation
+                poly_normals = numpy.empty(num_polys * 3, dtype=numpy.float32)
+                tmp_mesh.polygons.foreach_get('normal', poly_normals)
+                poly_loop_totals = numpy.empty(num_polys, dtype=numpy.int32)
+                tmp_mesh.polygons.foreach_get('loop_total', poly_loop_totals)
+                loop_normals = numpy.repeat(poly_normals.reshape(-1, 3), poly_loop_totals, axis=0)
+            else:
+                loop_normals = numpy.empty(num_loops * 3, dtype=numpy.float32)
+                tmp_mesh.corner_normals.foreach_get('vector', loop_normals)
+                loop_normals = loop_normals.reshape(-1, 3)
+
+            # corners sharing the same vertex, uv, ao and normal become a single s3o vertex
+            corner_data = numpy.column_stack((loop_uvs, loop_aos, loop_normals, loop_v_indices))
+            unique_data, first_loops, loop_to_unique = numpy.unique(
+                corner_data, axis=0, return_index=True, return_inverse=True
+            )
+
+            # numpy.unique sorts its output, put the vertices back in the order they are first used
+            order = numpy.argsort(first_loops)
+            unique_to_s3o_idx = numpy.empty_like(order)
+            unique_to_s3o_idx[order] = numpy.arange(len(order))
+            unique_data = unique_data[order]
+
+            v_positions = numpy.empty(len(tmp_mesh.vertices) * 3, dtype=numpy.float32)
+            tmp_mesh.vertices.foreach_get('co', v_positions)
+            v_positions = v_positions.reshape(-1, 3)[unique_data[:, 6].astype(int)]
+
+            for pos, (uv_x, uv_y, ao, norm_x, norm_y, norm_z, _) in zip(v_positions.tolist(), unique_data.tolist()):
+                new_vert = S3OVertex(Vector(pos), Vector((norm_x, norm_y, norm_z)), Vector((uv_x, uv_y)))
+                new_vert.ambient_occlusion = ao
                 new_vert.freeze()
                 piece.vertices.append(new_vert)
 
-            for loop_idx in range(len(tmp_mesh.loops)):
-                idx = loop_to_s3o_idx[loop_idx]
-                assert 0 <= idx < len(piece.vertices)
-                piece.indices.append(idx)
+            piece.indices.extend(unique_to_s3o_idx[loop_to_unique.ravel()].tolist())
 
             optimize_piece(piece)
         except Exception as err:
@@ -342,46 +403,48 @@ def blender_obj_to_piece(obj: bpy.types.Object) -> S3OPiece | None:
         if tmp_mesh is not None:
             bpy.data.meshes.remove(tmp_mesh)
 
-    piece.children = [
-        p for p in (blender_obj_to_piece(c) for c in obj.children) if p is not None
-    ]
+    # only meshes and aim points become pieces, placeholders and other children are skipped without recursing
+    for child in obj.children:
+        if child.type == 'MESH' or S3OAimPointProperties.poll(child):
+            child_piece = blender_obj_to_piece(child)
+            if child_piece is not None:
+                piece.children.append(child_piece)
 
     return piece
 
 
 def optimize_piece(piece: S3OPiece):
-    remap = {}
+    remap: dict[tuple[float, ...], int] = {}
+    new_vertices: list[S3OVertex] = []
     new_indices = []
     print('[INFO]', 'Optimizing:', piece.name)
-    for index in piece.indices:
-        vertex = piece.vertices[index]
-        vertex.freeze()
-        if vertex not in remap:
-            remap[vertex] = len(remap)
-        new_indices.append(remap[vertex])
 
-    new_vertices = [(index, vertex) for vertex, index in remap.items()]
-    new_vertices.sort()
-    new_vertices = [vertex for _, vertex in new_vertices]
+    # key the vertices on flat tuples of their components, plain floats hash quickly and compare by value
+    vertex_keys = [(*v.position, *v.normal, *v.tex_coords) for v in piece.vertices]
+    for index in piece.indices:
+        key = vertex_keys[index]
+        new_index = remap.get(key)
+        if new_index is None:
+            new_index = remap[key] = len(new_vertices)
+            new_vertices.append(piece.vertices[index])
+        new_indices.append(new_index)
 
     if piece.primitive_type == "triangles" and len(new_indices) > 0:
-        tris = list(batched(new_indices, 3))
+        tris = list(zip(new_indices[0::3], new_indices[1::3], new_indices[2::3]))
         acmr = vertex_cache.average_transform_to_vertex_ratio(tris)
 
         tmp = vertex_cache.get_cache_optimized_triangles(tris)
         acmr_new = vertex_cache.average_transform_to_vertex_ratio(tmp)
         if acmr_new < acmr:
-            new_indices = []
-            for tri in tmp:
-                new_indices.extend(tri)
+            new_indices = list(chain.from_iterable(tmp))
 
-    vertex_map = []
+    vertex_map: list[int] = []
+    vertex_map_pos: dict[int, int] = {}
     remapped_indices = []
     for index in new_indices:
-        try:
-            new_index = vertex_map.index(index)
-        except ValueError:
-            new_index = len(vertex_map)
+        new_index = vertex_map_pos.get(index)
+        if new_index is None:
+            new_index = vertex_map_pos[index] = len(vertex_map)
             vertex_map.append(index)
 
         remapped_indices.append(new_index)
@@ -391,3 +454,10 @@ def optimize_piece(piece: S3OPiece):
 
     piece.indices = new_indices
     piece.vertices = new_vertices
+
+
+def unregister():
+    global _scratch_bmesh
+    if _scratch_bmesh is not None:
+        _scratch_bmesh.free()
+        _scratch_bmesh = None
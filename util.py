@@ -3,7 +3,7 @@ import math
 import os.path
 from collections.abc import Iterable, Generator
 from enum import StrEnum
-from itertools import islice
+from itertools import islice, product
 from typing import TypeVar, ContextManager
 
 import numpy as np
@@ -67,6 +67,117 @@ def extract_null_terminated_string(data: bytes, offset: int) -> str:
         return data[offset:data.index(b'\x00', offset)].decode()
 
 
+_SPATIAL_HASH_PRIMES = np.array((73856093, 19349663, 83492791), dtype=np.int64)
+
+
+# above this many candidates per value, the values are too densely packed to compare every candidate pair at once
+_MAX_CANDIDATES_PER_VALUE = 32
+
+
+def _hash_neighbour_cells(
+    values: npt.NDArray, tolerance: float
+) -> tuple[npt.NDArray[int], npt.NDArray[int], npt.NDArray[int]]:
+    """
+    Bucket the rows so that every row within the tolerance of a row can be found without checking every other row.
+
+    The first (up to) three components are hashed into a grid of cells twice the size of the tolerance.
+    Each row is inserted into every cell its tolerance box overlaps (at most 2 per axis, so 8 cells)
+    and then only has to look in its own cell to find all its potential neighbours.
+    Hash collisions only add extra candidates, which the exact comparison filters out again.
+
+    :param values: 2D array, one value per row
+    :param tolerance: maximum absolute difference per component
+    :return: (cell_rows, starts, counts) where cell_rows[starts[i]:starts[i] + counts[i]] are the candidate
+             neighbours of row i (including row i itself)
+    """
+    hashed_values = values[:, :3]
+    num_dims = hashed_values.shape[1]
+    hash_primes = _SPATIAL_HASH_PRIMES[:num_dims]
+
+    # pad the tolerance box a little so float rounding can't make a neighbour miss a cell
+    half_cell_size = tolerance * 1.01
+    cell_size = 2 * half_cell_size
+
+    low_cells = np.floor((hashed_values - half_cell_size) / cell_size).astype(np.int64)
+    high_cells = np.floor((hashed_values + half_cell_size) / cell_size).astype(np.int64)
+
+    corners = np.array(list(product((False, True), repeat=num_dims)), dtype=bool).reshape(-1, 1, num_dims)
+    insert_cells = np.where(corners, high_cells, low_cells)
+    # skip the corners that land in the same cell as another corner
+    insert_mask = ~np.any(corners & (low_cells == high_cells), axis=2)
+    insert_rows = np.broadcast_to(np.arange(len(values)), insert_mask.shape)[insert_mask]
+    insert_hashes = np.bitwise_xor.reduce(insert_cells[insert_mask] * hash_primes, axis=1)
+
+    query_cells = np.floor(hashed_values / cell_size).astype(np.int64)
+    query_hashes = np.bitwise_xor.reduce(query_cells * hash_primes, axis=1)
+
+    insert_order = np.argsort(insert_hashes, kind='stable')
+    cell_rows = insert_rows[insert_order]
+    insert_hashes = insert_hashes[insert_order]
+
+    starts = np.searchsorted(insert_hashes, query_hashes, side='left')
+    counts = np.searchsorted(insert_hashes, query_hashes, side='right') - starts
+    return cell_rows, starts, counts
+
+
+def _find_close_pairs(
+    values: npt.NDArray,
+    tolerance: float,
+    cell_rows: npt.NDArray[int],
+    starts: npt.NDArray[int],
+    counts: npt.NDArray[int],
+) -> tuple[npt.NDArray[int], npt.NDArray[int]]:
+    """
+    Find every pair of rows whose components all differ by at most the tolerance,
+    by comparing each row against all the candidates from _hash_neighbour_cells at once.
+
+    :return: (earlier, later) row indices of each close pair, sorted by the later row and then the earlier one
+    """
+    # expand each query row into one candidate pair per row found in its cell
+    later = np.repeat(np.arange(len(values)), counts)
+    earlier = cell_rows[np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+
+    candidates = earlier < later
+    earlier, later = earlier[candidates], later[candidates]
+
+    # compare one component at a time, so each column only has to check the pairs that are still close
+    for column in values.T:
+        is_close = np.abs(column[earlier] - column[later]) <= tolerance
+        earlier, later = earlier[is_close], later[is_close]
+
+    pair_order = np.lexsort((earlier, later))
+    return earlier[pair_order], later[pair_order]
+
+
+def _sweep_duplicates(
+    values: npt.NDArray,
+    tolerance: float,
+    cell_rows: npt.NDArray[int],
+    starts: npt.NDArray[int],
+    counts: npt.NDArray[int],
+) -> npt.NDArray[int]:
+    """
+    Map every row to the first earlier row within the tolerance that is not a duplicate itself (or to itself).
+
+    Goes through the rows in order and lets each non-duplicate row claim its not yet claimed candidates.
+    Rows that got claimed are skipped, so a dense group of nearly equal rows only gets compared once.
+    """
+    idx_to_orig_idx = np.arange(len(values))
+    columns = list(values.T)
+    for idx, start, count in zip(range(len(values)), starts.tolist(), counts.tolist()):
+        if idx_to_orig_idx[idx] != idx:
+            continue
+
+        candidates = cell_rows[start:start + count]
+        candidates = candidates[candidates > idx]
+        candidates = candidates[idx_to_orig_idx[candidates] == candidates]
+        for column in columns:
+            candidates = candidates[np.abs(column[candidates] - column[idx]) <= tolerance]
+        idx_to_orig_idx[candidates] = idx
+
+    return idx_to_orig_idx
+
+
 def make_duplicates_mapping(
     values: dict[int, npt.ArrayLike] | npt.ArrayLike,
     tolerance=0.001,
@@ -88,24 +199,66 @@ def make_duplicates_mapping(
 
         idx_to_orig_idx = np.arange(len(np_array), dtype=int)
 
-        for idx in range(len(np_array) - 1):
-            current_value = np_array[idx]
-
-            # skip if value is "empty" or if this value was already marked as a duplicate
-            if np.all(np.isnan(current_value)):
-                continue
-            if idx_to_orig_idx[idx] < idx:
-                continue
-
-            slice_compare_results = np.isclose(np_array[idx + 1:], current_value, atol=tolerance, rtol=0)
-            # exclude first axis
-            slice_compare_results = np.all(slice_compare_results, axis=tuple(range(1, np_array.ndim)))
-            np.copyto(idx_to_orig_idx[idx + 1:], idx, where=slice_compare_results)
-        return idx_to_orig_idx
+        # compare flattened rows, one row holding every component of a value
+        flat_array = np_array.reshape(len(np_array), -1)
+        # "empty" values are never duplicates of anything
+        value_rows = np.flatnonzero(~np.all(np.isnan(flat_array), axis=1))
+
+        # exact copies always end up mapped the same way as the first of them,
+        # so only the distinct values need to go through the tolerance search
+        # (values that are only nearly equal are still all there, see the sweep below for dense groups of those)
+        _, first_copies, copy_indices = np.unique(
+            flat_array[value_rows], axis=0, return_index=True, return_inverse=True
+        )
+        first_copy_rows = value_rows[first_copies]
+        idx_to_orig_idx[value_rows] = first_copy_rows[copy_indices.ravel()]
+        distinct_rows = np.sort(first_copy_rows)
+
+        distinct_values = flat_array[distinct_rows]
+        cell_rows, starts, counts = _hash_neighbour_cells(distinct_values, tolerance)
+
+        if counts.sum() > _MAX_CANDIDATES_PER_VALUE * len(distinct_values):
+            # densely packed values (e.g. the slightly noisy normals of a flat surface) would make far too many
+            # candidate pairs, sweeping through them keeps the work and memory close to linear instead
+            distinct_to_orig = _sweep_duplicates(distinct_values, tolerance, cell_rows, starts, counts)
+            idx_to_orig_idx[distinct_rows] = distinct_rows[distinct_to_orig]
+            return idx_to_orig_idx[idx_to_orig_idx]
+
+        earlier, later = _find_close_pairs(distinct_values, tolerance, cell_rows, starts, counts)
+        if len(later) == 0:
+            return idx_to_orig_idx
+        earlier, later = distinct_rows[earlier], distinct_rows[later]
+
+        # a value becomes a duplicate of the first earlier value close to it that is not a duplicate itself.
+        # values without any earlier close values can never be duplicates, so every value whose first close
+        # value is one of those is resolved straight away
+        is_first_pair = np.concatenate(((True,), later[1:] != later[:-1]))
+        first_earlier, first_later = earlier[is_first_pair], later[is_first_pair]
+
+        has_earlier = np.zeros(len(np_array), dtype=bool)
+        has_earlier[first_later] = True
+        is_resolved = ~has_earlier[first_earlier]
+        idx_to_orig_idx[first_later[is_resolved]] = first_earlier[is_resolved]
+
+        # the rest are part of chains of close values, those have to be walked in index order
+        chain_pairs = np.isin(later, first_later[~is_resolved])
+        if np.any(chain_pairs):
+            idx_to_orig_list = idx_to_orig_idx.tolist()
+            for earlier_idx, later_idx in zip(earlier[chain_pairs].tolist(), later[chain_pairs].tolist()):
+                if idx_to_orig_list[later_idx] == later_idx and idx_to_orig_list[earlier_idx] == earlier_idx:
+                    idx_to_orig_list[later_idx] = earlier_idx
+            idx_to_orig_idx = np.array(idx_to_orig_list, dtype=int)
+
+        # and finally the exact copies follow wherever their first copy went
+        return idx_to_orig_idx[idx_to_orig_idx]
 
     except Exception as err:
         print("WARNING could not find dupes!", err)
-    return {}
+
+    # fall back to mapping every index to itself, so callers can always index into the result
+    if type(values) is dict:
+        return np.arange(max(values.keys(), default=-1) + 1, dtype=int)
+    return np.arange(len(values), dtype=int)
 
 
 def strip_suffix(blender_name: str):
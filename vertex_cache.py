@@ -44,6 +44,7 @@ http://home.comcast.net/~tom_forsyth/papers/fast_vert_cache_opt.html
 # ***** END LICENSE BLOCK *****
 
 import collections
+import heapq
 
 
 class VertexInfo:
@@ -178,14 +179,22 @@ class Mesh:
         """
         triangles = []
         cache = collections.deque()
-        while any(not triangle_info.added for triangle_info in self.triangle_infos):
+        # heap of (-score, triangle index), so the best triangle (lowest
+        # index on ties) is on top; entries are pushed again whenever a
+        # score changes and stale ones are skipped when popped
+        score_heap = [
+            (-triangle_info.score, triangle_index)
+            for triangle_index, triangle_info in enumerate(self.triangle_infos)
+        ]
+        heapq.heapify(score_heap)
+        num_remaining = len(self.triangle_infos)
+        while num_remaining > 0:
             # pick triangle with highest score
-            best_triangle_index, best_triangle_info = max(
-                (triangle
-                    for triangle in enumerate(self.triangle_infos)
-                    if not triangle[1].added),
-                key=lambda triangle: triangle[1].score
-            )
+            neg_score, best_triangle_index = heapq.heappop(score_heap)
+            best_triangle_info = self.triangle_infos[best_triangle_index]
+            if best_triangle_info.added or -neg_score != best_triangle_info.score:
+                continue
+            num_remaining -= 1
             # mark as added
             best_triangle_info.added = True
             # append to ordered list of triangles
@@ -233,6 +242,7 @@ class Mesh:
                     self.vertex_infos[vertex].score
                         for vertex in triangle_info.vertex_indices
                 )
+                heapq.heappush(score_heap, (-triangle_info.score, triangle))
         # return result
         return triangles
 
@@ -4,61 +4,105 @@ import bpy.utils
 from bl_ui.generic_ui_list import draw_ui_list
 from bpy.types import Panel, Context, UILayout
 from . import bl_info
-from .ambient_occlusion import AOProps, ObjectExplodeEntry
+from .ambient_occlusion import AOProps, ObjectExplodeEntry, AddObjExplodeEntry, RemoveObjExplodeEntry, ToAOView, \
+    ToRenderView, ResetAO, BakeVertexAO, BakePlateAO
+from .io_ops import ImportSpring3dObject, ExportSpring3dObject, ImportTextures
+from .obj_ops import AddS3ORoot, AddS3OAimPoint, AddMeshAsChild, SetAllRotationModes, S3OifyExistingObjectHierarchy
 from .util import S3OIcon
 
 
-class MainPanel(Panel):
-    bl_idname = "S3O_PT_view_3d_main"
-    bl_label = f"S3O Kit v{'.'.join(str(x) for x in bl_info['version'])}"
+# (operator class, keyword arguments for UILayout.operator) for each plain operator button of a section
+_ADD_OPS = (
+    (AddS3ORoot, {'icon': 'EMPTY_ARROWS'}),
+    (AddS3OAimPoint, {'icon': 'EMPTY_SINGLE_ARROW'}),
+)
+
+_IMPORT_EXPORT_OPS = (
+    (ImportTextures, {'icon': 'TEXTURE'}),
+    (ImportSpring3dObject, {'text': "Import *.s3o", 'icon': 'IMPORT'}),
+    (ExportSpring3dObject, {'text': "Export *.s3o", 'icon': 'EXPORT'}),
+)
+
+# draw_ui_list arguments for the explode list, these never change between draws
+_EXPLODE_UI_LIST_KWARGS = {
+    'class_name': 'S3O_UL_objects_to_explode',
+    'unique_id': 's3o_ao_objs_to_explode_ui_list',
+    'list_path': 'scene.s3o_ao.objects_to_explode',
+    'active_index_path': 'scene.s3o_ao.selected_explode_entry',
+    'insertion_operators': False,
+    'move_operators': False,
+}
+
+
+def _sub_panel(layout: UILayout, idname: str, title: str) -> UILayout | None:
+    """ Adds a collapsible sub panel with a plain text header, returns its body (None while collapsed) """
+    header, body = layout.panel(idname)
+    header.label(text=title)
+    return body
+
+
+def _panel_view_settings(layout: UILayout, context: Context):
+    body = _sub_panel(layout, 's3o_view', "View Settings")
+    if body is not None:
+        col = body.column()
+        col.prop(context.space_data.overlay, 'show_extras', text="Show Empties")
+
+
+def _panel_add(layout: UILayout, context: Context):
+    body = _sub_panel(layout, 's3o_add', "Add")
+    if body is not None:
+        col: bpy.types.UILayout = body.column(align=True)
+        for op_class, kwargs in _ADD_OPS:
+            col.operator(op_class.bl_idname, **kwargs)
+        row = col.row()
+        row.enabled = AddMeshAsChild.poll(context)
+        row.operator_menu_enum(AddMeshAsChild.bl_idname, 'mesh_type', icon='OUTLINER_OB_MESH')
+
+
+def _panel_import_export(layout: UILayout):
+    body = _sub_panel(layout, 's3o_import_export', "Import / Export")
+    if body is not None:
+        col = body.column(align=True)
+        for op_class, kwargs in _IMPORT_EXPORT_OPS:
+            col.operator(op_class.bl_idname, **kwargs)
+
+
+def _panel_util(layout: UILayout):
+    body = _sub_panel(layout, 's3o_import_util', "Utilities")
+    if body is not None:
+        col = body.column(align=True)
+        col.operator_menu_enum(SetAllRotationModes.bl_idname, 'mode', icon='ORIENTATION_GIMBAL')
+        col.operator(S3OifyExistingObjectHierarchy.bl_idname, icon='SHADERFX')
+
+
+def _prepare_ao_layout(layout: UILayout, context: Context):
+    layout.use_property_split = True
+    layout.use_property_decorate = False
+    # the parent panel shows the missing world warning, the sections are only greyed out
+    layout.active = context.scene.world is not None
+
+
+class S3OSidebarPanel(Panel):
     bl_space_type = 'VIEW_3D'
     bl_region_type = 'UI'
     bl_category = "S3O"
 
+
+class S3OSidebarLogoPanel(S3OSidebarPanel):
     def draw_header(self, context: 'Context'):
         self.layout.label(icon_value=S3OIcon.LOGO_TRANSPARENT.icon_id)
 
+
+class MainPanel(S3OSidebarLogoPanel):
+    bl_idname = "S3O_PT_view_3d_main"
+    bl_label = f"S3O Kit v{'.'.join(str(x) for x in bl_info['version'])}"
+
     def draw(self, context: Context):
         layout = self.layout
-        self.panel_view_settings(layout)
-        self.panel_add(layout, context)
-        self.panel_import_export(layout, context)
-        self.panel_util(layout, context)
-
-    def panel_view_settings(self, layout: UILayout):
-        (header, body) = layout.panel('s3o_view')
-        header.label(text="View Settings")
-        if body is not None:
-            col = body.column()
-            col.prop(bpy.context.space_data.overlay, 'show_extras', text="Show Empties")
-
-    def panel_add(self, layout: UILayout, _: Context):
-        (header, body) = layout.panel('s3o_add')
-        header.label(text="Add")
-        if body is not None:
-            col: bpy.types.UILayout = body.column(align=True)
-            col.operator('s3o_tools.add_s3o_root', icon='EMPTY_ARROWS')
-            col.operator('s3o_tools.add_s3o_aim_point', icon='EMPTY_SINGLE_ARROW')
-            row = col.row()
-            row.enabled = bpy.ops.s3o_tools.add_mesh_as_child.poll()
-            row.operator_menu_enum("s3o_tools.add_mesh_as_child", 'mesh_type', icon='OUTLINER_OB_MESH')
-
-    def panel_import_export(self, layout: UILayout, _: Context):
-        (header, body) = layout.panel('s3o_import_export')
-        header.label(text="Import / Export")
-        if body is not None:
-            col = body.column(align=True)
-            col.operator("s3o_tools.import_textures", icon='TEXTURE')
-            col.operator("s3o_tools.import_s3o", text="Import *.s3o", icon='IMPORT')
-            col.operator("s3o_tools.export_s3o", text="Export *.s3o", icon='EXPORT')
-
-    def panel_util(self, layout: UILayout, _: Context):
-        (header, body) = layout.panel('s3o_import_util')
-        header.label(text="Utilities")
-        if body is not None:
-            col = body.column(align=True)
-            col.operator_menu_enum("s3o_tools.set_all_rotation_modes", 'mode', icon='ORIENTATION_GIMBAL')
-            col.operator("s3o_tools.s3oify_object_hierarchy", icon='SHADERFX')
+        _panel_view_settings(layout, context)
+        _panel_add(layout, context)
+        _panel_import_export(layout)
+        _panel_util(layout)
 
 
 class ObjectsToExplodeList(bpy.types.UIList):
@@ -76,24 +120,15 @@ class ObjectsToExplodeList(bpy.types.UIList):
         index: typing.Optional[typing.Any] = 0,
         flt_flag: typing.Optional[typing.Any] = 0
     ):
-        row = layout.row(align=True)
-        row.prop(item, 'obj', text="")
+        layout.prop(item, 'obj', text="")
 
 
-class AOPanel(Panel):
+class AOPanel(S3OSidebarLogoPanel):
     bl_idname = "S3O_PT_view_3d_ao"
     bl_label = "Ambient Occlusion"
-    bl_space_type = 'VIEW_3D'
-    bl_region_type = 'UI'
-    bl_category = "S3O"
-
-    def draw_header(self, context: 'Context'):
-        self.layout.label(icon_value=S3OIcon.LOGO_TRANSPARENT.icon_id)
 
     def draw(self, context: Context):
         layout = self.layout
-        layout.use_property_split = True
-        layout.use_property_decorate = False
 
         if context.scene.world is None:
             layout.alert = True
@@ -106,110 +141,100 @@ class AOPanel(Panel):
             layout = layout.column()
             layout.active = False
 
-        if context.scene.world is None:
-            layout.alert = True
+        col = layout.column(align=True)
+        col.operator(ToAOView.bl_idname)
+        col.operator(ToRenderView.bl_idname)
 
-            alert_box = layout.box()
-            alert_box.label(icon='ERROR', text='Missing World Settings')
-            alert_box.label(icon='WORLD', text='Fix in World Properties')
 
-            layout.separator(factor=2)
-            layout = layout.column()
-            layout.active = False
+class AOSubPanel(S3OSidebarPanel):
+    bl_parent_id = AOPanel.bl_idname
+
+
+class AOSettingsPanel(AOSubPanel):
+    bl_idname = "S3O_PT_view_3d_ao_settings"
+    bl_label = "AO Settings"
+
+    def draw(self, context: Context):
+        layout = self.layout
+        _prepare_ao_layout(layout, context)
+        ao: AOProps = context.scene.s3o_ao
 
         col = layout.column(align=True)
-        col.operator('s3o_tools_ao.to_ao_view')
-        col.operator('s3o_tools_ao.to_rendered_view')
-
-        self.panel_settings(layout, context)
-        self.panel_objs_to_explode(layout, context)
-        self.panel_bake(layout, context)
-
-    def panel_settings(self, layout: UILayout, context: Context):
-        header: UILayout
-        body: UILayout | None
-        (header, body) = layout.panel('s3o_ao_settings_panel')
-        header.label(text="AO Settings")
-        if body is None:
-            return
-        col = body.column(align=True)
-        col.prop(context.scene.s3o_ao, "min_distance", slider=True)
-        col.prop(context.scene.s3o_ao, "distance", slider=True)
-        col.prop(context.scene.s3o_ao, "min_clamp")
-        col.prop(context.scene.s3o_ao, "bias")
-        col.prop(context.scene.s3o_ao, "gain")
-
-        body.use_property_split = False
-        body.prop(context.scene.s3o_ao, "ground_plate")
-        body.use_property_split = True
-
-        plate_col = body.column(align=True)
-        plate_col.active = context.scene.s3o_ao.ground_plate
-        plate_col.prop(context.scene.s3o_ao, "building_plate_size_x")
-        plate_col.prop(context.scene.s3o_ao, "building_plate_size_z")
-        plate_col.prop(context.scene.s3o_ao, "building_plate_resolution")
+        col.prop(ao, "min_distance", slider=True)
+        col.prop(ao, "distance", slider=True)
+        col.prop(ao, "min_clamp")
+        col.prop(ao, "bias")
+        col.prop(ao, "gain")
+
+        plate_row = layout.row()
+        plate_row.use_property_split = False
+        plate_row.prop(ao, "ground_plate")
+
+        plate_col = layout.column(align=True)
+        plate_col.active = ao.ground_plate
+        plate_col.prop(ao, "building_plate_size_x")
+        plate_col.prop(ao, "building_plate_size_z")
+        plate_col.prop(ao, "building_plate_resolution")
         # Not sure if this does anything for this use case
         # col.prop(context.scene.cycles, "ao_bounces_render", text="AO Bounces")
 
-    def panel_objs_to_explode(self, layout: UILayout, context: Context):
-        header: UILayout
-        body: UILayout | None
-        (header, body) = layout.panel('s3o_ao_objs_to_explode_panel')
-        header.label(text="Objects to 'Explode'")
-        if body is None:
-            return
-        col = body.column()
+
+class AOObjsToExplodePanel(AOSubPanel):
+    bl_idname = "S3O_PT_view_3d_ao_objs_to_explode"
+    bl_label = "Objects to 'Explode'"
+
+    def draw(self, context: Context):
+        layout = self.layout
+        _prepare_ao_layout(layout, context)
+        ao: AOProps = context.scene.s3o_ao
+
+        col = layout.column()
         row = col.row(align=True)
 
-        draw_ui_list(
-            row,
-            context,
-            class_name='S3O_UL_objects_to_explode',
-            unique_id='s3o_ao_objs_to_explode_ui_list',
-            list_path='scene.s3o_ao.objects_to_explode',
-            active_index_path='scene.s3o_ao.selected_explode_entry',
-            insertion_operators=False,
-            move_operators=False,
-        )
+        # skip building the list widget while there is nothing to show in it
+        if len(ao.objects_to_explode) == 0:
+            row.label(text="(empty)")
+        else:
+            draw_ui_list(row, context, **_EXPLODE_UI_LIST_KWARGS)
 
         list_buttons_col = row.column()
-        list_buttons_col.operator("s3o_tools_ao.add_explode_entry", icon='ADD', text="")
-        list_buttons_col.operator("s3o_tools_ao.remove_explode_entry", icon='REMOVE', text="")
+        list_buttons_col.operator(AddObjExplodeEntry.bl_idname, icon='ADD', text="")
+        list_buttons_col.operator(RemoveObjExplodeEntry.bl_idname, icon='REMOVE', text="")
 
-    def panel_bake(self, layout: UILayout, context: Context):
-        header: UILayout
-        body: UILayout | None
-        (header, body) = layout.panel('s3o_ao_bake_panel')
-        header.label(text="AO Bake")
-        if body is None:
-            return
 
-        col = body.column(align=True)
+class AOBakePanel(AOSubPanel):
+    bl_idname = "S3O_PT_view_3d_ao_bake"
+    bl_label = "AO Bake"
+
+    def draw(self, context: Context):
+        layout = self.layout
+        _prepare_ao_layout(layout, context)
+        ao: AOProps = context.scene.s3o_ao
+
+        col = layout.column(align=True)
 
-        (bake_header, bake_box) = col.panel('s3o_ao_bake_panel_target')
-        bake_header.label(text="Target")
+        bake_box = _sub_panel(col, 's3o_ao_bake_panel_target', "Target")
         if bake_box is not None:
-            bake_box: UILayout
             bake_box.use_property_split = False
-            bake_box.prop(context.scene.s3o_ao, 'bake_target', expand=True)
+            bake_box.prop(ao, 'bake_target', expand=True)
 
         col.separator()
 
         reset_row = col.row(align=True)
-        reset_row.operator('s3o_tools_ao.reset_ao_value')
-        reset_row.prop(context.scene.s3o_ao, 'reset_ao_value', text="")
-
-        col.operator('s3o_tools_ao.bake_vertex_ao')
-        col.operator('s3o_tools_ao.bake_building_plate')
-
-
-def register():
-    bpy.utils.register_class(MainPanel)
-    bpy.utils.register_class(ObjectsToExplodeList)
-    bpy.utils.register_class(AOPanel)
-
-
-def unregister():
-    bpy.utils.unregister_class(MainPanel)
-    bpy.utils.unregister_class(ObjectsToExplodeList)
-    bpy.utils.unregister_class(AOPanel)
+        reset_row.operator(ResetAO.bl_idname)
+        reset_row.prop(ao, 'reset_ao_value', text="")
+
+        col.operator(BakeVertexAO.bl_idname)
+        col.operator(BakePlateAO.bl_idname)
+
+
+register, unregister = bpy.utils.register_classes_factory(
+    [
+        MainPanel,
+        ObjectsToExplodeList,
+        AOPanel,
+        AOSettingsPanel,
+        AOObjsToExplodePanel,
+        AOBakePanel,
+    ]
+)